@@ -40,8 +40,14 @@ class SiestaCommonBandsInputGenerator(CommonBandsInputGenerator):
 
         # Construct the builder of the `common_bands_wc` from the builder of a SiestaCalculation.
         # Siesta specific: we have to eampty the metadata and put the resources in `options`.
+        # The options of the parent calculation are only used if not overridden by the `engines`.
+        engb = engines['bands']
+        if 'options' in engb:
+            options = engb['options']
+        else:
+            options = dict(builder_siesta_calc.metadata.options)
         builder_common_bands_wc = self.process_class.get_builder()
-        builder_common_bands_wc.options = orm.Dict(dict=dict(builder_siesta_calc.metadata.options))
+        builder_common_bands_wc.options = orm.Dict(dict=options)
         builder_siesta_calc.metadata = {}
         for key, value in builder_siesta_calc.items():
             if value and key != 'metadata':
@@ -51,10 +57,7 @@ class SiestaCommonBandsInputGenerator(CommonBandsInputGenerator):
         if 'output_structure' in parent_siesta_calc.outputs:
             builder_common_bands_wc.structure = parent_siesta_calc.outputs.output_structure
 
-        engb = engines['bands']
-        builder_common_bands_wc.code = engines['bands']['code']
-        if 'options' in engb:
-            builder_common_bands_wc.options = orm.Dict(dict=engines['bands']['options'])
+        builder_common_bands_wc.code = engb['code']
 
         # Set the `bandskpoints` and the `parent_calc_folder` for restart
         builder_common_bands_wc.bandskpoints = bands_kpoints
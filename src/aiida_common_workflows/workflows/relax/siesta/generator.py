@@ -1,5 +1,8 @@
 """Implementation of `aiida_common_workflows.common.relax.generator.CommonRelaxInputGenerator` for SIESTA."""
+import copy
+import functools
 import os
+import warnings
 
 import yaml
 from aiida import engine, orm, plugins
@@ -15,45 +18,103 @@ __all__ = ('SiestaCommonRelaxInputGenerator',)
 StructureData = plugins.DataFactory('core.structure')
 
 
+@functools.lru_cache(maxsize=64)
+def _cached_get_group(label):
+    """Return the group with the given label, caching it for the lifetime of the process.
+
+    Failed lookups raise and are therefore not cached. Call ``_cached_get_group.cache_clear()`` to reset the cache.
+    """
+    return orm.Group.collection.get(label=label)
+
+
 class SiestaCommonRelaxInputGenerator(CommonRelaxInputGenerator):
     """Generator of inputs for the SiestaCommonRelaxWorkChain"""
 
     _default_protocol = 'moderate'
+    _protocols_mtime = None
+    _mesh_cutoffs = None
+    _validated_protocols = None
 
     def __init__(self, *args, **kwargs):
-        """Construct an instance of the input generator, validating the class attributes."""
+        """Construct an instance of the input generator, validating the class attributes.
+
+        The SIESTA specific keys of a protocol are only validated when the protocol is first used, see
+        ``_validate_protocol``.
+        """
 
         self._initialize_protocols()
 
         super().__init__(*args, **kwargs)
 
+    def _validate_protocol(self, key):
+        """Validate the SIESTA specific keys of the protocol `key`.
+
+        Each protocol is validated only once, the first time it is used.
+        """
+        if key in self._validated_protocols:
+            return
+
         def raise_invalid(message):
             raise RuntimeError(f'invalid protocol registry `{self.__class__.__name__}`: ' + message)
 
-        for k, v in self._protocols.items():
-            if 'parameters' not in v:
-                raise_invalid(f'protocol `{k}` does not define the mandatory key `parameters`')
-            if 'mesh-cutoff' in v['parameters']:
-                try:
-                    float(v['parameters']['mesh-cutoff'].split()[0])
-                    str(v['parameters']['mesh-cutoff'].split()[1])
-                except (ValueError, IndexError):
-                    raise_invalid(
-                        f'Wrong format of `mesh-cutoff` in `parameters` of protocol `{k}`. Value and units are required'
-                    )
+        protocol = self._protocols[key]
+
+        if 'parameters' not in protocol:
+            raise_invalid(f'protocol `{key}` does not define the mandatory key `parameters`')
+        if 'mesh-cutoff' in protocol['parameters'] and self._mesh_cutoffs[key]['parameters'] is None:
+            raise_invalid(
+                f'Wrong format of `mesh-cutoff` in `parameters` of protocol `{key}`. Value and units are required'
+            )
 
-            if 'basis' not in v:
-                raise_invalid(f'protocol `{k}` does not define the mandatory key `basis`')
+        if 'basis' not in protocol:
+            raise_invalid(f'protocol `{key}` does not define the mandatory key `basis`')
 
-            if 'pseudo_family' not in v:
-                raise_invalid(f'protocol `{k}` does not define the mandatory key `pseudo_family`')
+        if 'pseudo_family' not in protocol:
+            raise_invalid(f'protocol `{key}` does not define the mandatory key `pseudo_family`')
+
+        self._validated_protocols.add(key)
+
+    @classmethod
+    def _initialize_protocols(cls):
+        """Initialize the protocols class attribute by parsing them from the configuration file.
 
-    def _initialize_protocols(self):
-        """Initialize the protocols class attribute by parsing them from the configuration file."""
+        The parsed protocols are cached on the class and the file is only parsed again if its modification time changed.
+        """
         _filepath = os.path.join(os.path.dirname(__file__), 'protocol.yml')
+        _mtime = os.stat(_filepath).st_mtime
+
+        if cls._protocols is not None and cls._protocols_mtime == _mtime:
+            return
 
         with open(_filepath, encoding='utf-8') as _thefile:
-            self._protocols = yaml.full_load(_thefile)
+            cls._protocols = yaml.full_load(_thefile)
+        cls._protocols_mtime = _mtime
+        cls._validated_protocols = set()
+
+        # Split the `mesh-cutoff` strings once, so that applying the heuristics only requires float comparisons.
+        cls._mesh_cutoffs = {}
+        for key, protocol in cls._protocols.items():
+            mesh_cutoffs = {'atomic_heuristics': {}}
+            if 'mesh-cutoff' in protocol.get('parameters', {}):
+                mesh_cutoffs['parameters'] = cls._split_mesh_cutoff(protocol['parameters']['mesh-cutoff'])
+            for symbol, heuristic in protocol.get('atomic_heuristics', {}).items():
+                if 'mesh-cutoff' in heuristic.get('parameters', {}):
+                    mesh_cutoffs['atomic_heuristics'][symbol] = cls._split_mesh_cutoff(
+                        heuristic['parameters']['mesh-cutoff']
+                    )
+            cls._mesh_cutoffs[key] = mesh_cutoffs
+
+        cls._get_protocol_param.cache_clear()
+        cls._get_protocol_basis.cache_clear()
+
+    @staticmethod
+    def _split_mesh_cutoff(mesh_cutoff):
+        """Return the value and units of a `mesh-cutoff` string as a tuple, or `None` if the format is not valid."""
+        try:
+            value, units, *_ = mesh_cutoff.split()
+            return float(value), units
+        except (AttributeError, ValueError):
+            return None
 
     @classmethod
     def define(cls, spec):
@@ -88,16 +149,15 @@ class SiestaCommonRelaxInputGenerator(CommonRelaxInputGenerator):
 
         # Checks
         if protocol not in self.get_protocol_names():
-            import warnings
-
             warnings.warn(f'no protocol implemented with name {protocol}, using default moderate')
             protocol = self.get_default_protocol_name()
         if 'relax' not in engines:
             raise ValueError('The `engines` dictionaly must contain "relax" as outermost key')
+        self._validate_protocol(protocol)
 
         pseudo_family = self._protocols[protocol]['pseudo_family']
         try:
-            orm.Group.collection.get(label=pseudo_family)
+            _cached_get_group(pseudo_family)
         except exceptions.NotExistent as exc:
             raise ValueError(
                 f'protocol `{protocol}` requires `pseudo_family` with name {pseudo_family} '
@@ -127,15 +187,10 @@ class SiestaCommonRelaxInputGenerator(CommonRelaxInputGenerator):
             parameters['spin'] = 'polarized'
         if magnetization_per_site is not None:
             if spin_type == SpinType.NONE:
-                import warnings
-
                 warnings.warn('`magnetization_per_site` will be ignored as `spin_type` is set to SpinType.NONE')
             if spin_type == SpinType.COLLINEAR:
-                in_spin_card = '\n'
-                for i, magn in enumerate(magnetization_per_site):
-                    in_spin_card += f' {i+1} {magn} \n'
-                in_spin_card += '%endblock dm-init-spin'
-                parameters['%block dm-init-spin'] = in_spin_card
+                lines = [f' {i+1} {magn} ' for i, magn in enumerate(magnetization_per_site)]
+                parameters['%block dm-init-spin'] = '\n'.join(['', *lines, '%endblock dm-init-spin'])
 
         # Basis
         basis = self._get_basis(protocol, structure)
@@ -155,133 +210,132 @@ class SiestaCommonRelaxInputGenerator(CommonRelaxInputGenerator):
 
         return builder
 
-    def _get_param(self, key, structure, reference_workchain):  # noqa: PLR0912
+    def _get_param(self, key, structure, reference_workchain):
         """
         Method to construct the `parameters` input. Heuristics are applied, a dictionary
         with the parameters is returned.
         """
-        parameters = self._protocols[key]['parameters'].copy()
-        for par, value in self._protocols[key]['parameters'].items():
+        parameters = copy.deepcopy(self._get_protocol_param(key, self._get_kinds_signature(structure)))
+
+        # We fix the `mesh-sizes` to the one of reference_workchain, we need to access
+        # the underline SiestaBaseWorkChain.
+        if reference_workchain is not None:
+            siesta_base = reference_workchain.base.links.get_outgoing(node_class=orm.WorkChainNode).one().node
+            siesta_base_outs = siesta_base.outputs
+            mesh = siesta_base_outs.output_parameters.base.attributes.get('mesh')
+            parameters['mesh-sizes'] = f'[{mesh[0]} {mesh[1]} {mesh[2]}]'
+            parameters.pop('mesh-cutoff', None)
+
+        return parameters
+
+    def _get_basis(self, key, structure):
+        """
+        Method to construct the `basis` input.
+        Heuristics are applied, a dictionary with the basis is returned.
+        """
+        return copy.deepcopy(self._get_protocol_basis(key, self._get_kinds_signature(structure)))
+
+    @staticmethod
+    def _get_kinds_signature(structure):
+        """Return the tuple of ``(name, symbol)`` of the kinds of the structure, which is all the heuristics rely on."""
+        return tuple((kind.name, kind.symbol) for kind in structure.kinds)
+
+    @classmethod
+    @functools.lru_cache(maxsize=128)
+    def _get_protocol_param(cls, key, kinds):  # noqa: PLR0912
+        """
+        Return the `parameters` of protocol `key` with the heuristics applied for the given `kinds`.
+        The result is memoized, therefore it must not be modified by the caller.
+        """
+        parameters = cls._protocols[key]['parameters'].copy()
+        for par, value in cls._protocols[key]['parameters'].items():
             if 'block' in par:
                 parameters['%' + par] = value
                 parameters.pop(par, None)
 
-        if 'atomic_heuristics' in self._protocols[key]:
-            atomic_heuristics = self._protocols[key]['atomic_heuristics']
+        if 'atomic_heuristics' in cls._protocols[key]:
+            atomic_heuristics = cls._protocols[key]['atomic_heuristics']
+
+            mesh_cutoffs = cls._mesh_cutoffs[key]
 
             if 'mesh-cutoff' in parameters:
-                meshcut_glob = parameters['mesh-cutoff'].split()[0]
-                meshcut_units = parameters['mesh-cutoff'].split()[1]
+                meshcut_glob, meshcut_units = mesh_cutoffs['parameters']
             else:
                 meshcut_glob = None
+            meshcut = meshcut_glob
 
             # Run through heuristics
-            for kind in structure.kinds:
-                need_to_apply = False
-                try:
-                    cust_param = atomic_heuristics[kind.symbol]['parameters']
-                    need_to_apply = True
-                except KeyError:
-                    pass
-                if need_to_apply:
+            for _, symbol in kinds:
+                cust_param = atomic_heuristics.get(symbol, {}).get('parameters')
+                if cust_param is not None:
                     if 'mesh-cutoff' in cust_param:
-                        try:
-                            cust_meshcut = float(cust_param['mesh-cutoff'].split()[0])
-                        except (ValueError, IndexError) as exc:
+                        cust_meshcut = mesh_cutoffs['atomic_heuristics'][symbol]
+                        if cust_meshcut is None:
                             raise RuntimeError(
-                                f'Wrong `mesh-cutoff` value for heuristc {kind.symbol} of protocol {key}'
-                            ) from exc
-                        if meshcut_glob is not None:
-                            if cust_meshcut > float(meshcut_glob):
-                                meshcut_glob = cust_meshcut
+                                f'Wrong format of `mesh-cutoff` for heuristc {symbol} of protocol {key}. '
+                                'Value and units are required'
+                            )
+                        if meshcut is not None:
+                            meshcut = max(meshcut, cust_meshcut[0])
                         else:
-                            meshcut_glob = cust_meshcut
-                            try:
-                                meshcut_units = cust_param['mesh-cutoff'].split()[1]
-                            except (ValueError, IndexError) as exc:
-                                raise RuntimeError(
-                                    f'Wrong `mesh-cutoff` units for heuristc {kind.symbol} of protocol {key}'
-                                ) from exc
+                            meshcut, meshcut_units = cust_meshcut
                     if 'grid-sampling' in cust_param:
                         parameters['%block GridCellSampling'] = (
                             cust_param['grid-sampling'] + '\n%endblock GridCellSampling'
                         )
 
-            if meshcut_glob is not None:
-                parameters['mesh-cutoff'] = f'{meshcut_glob} {meshcut_units}'
-
-        # We fix the `mesh-sizes` to the one of reference_workchain, we need to access
-        # the underline SiestaBaseWorkChain.
-        if reference_workchain is not None:
-            from aiida.orm import WorkChainNode
-
-            siesta_base_outs = reference_workchain.base.links.get_outgoing(node_class=WorkChainNode).one().node.outputs
-            mesh = siesta_base_outs.output_parameters.base.attributes.get('mesh')
-            parameters['mesh-sizes'] = f'[{mesh[0]} {mesh[1]} {mesh[2]}]'
-            parameters.pop('mesh-cutoff', None)
+            # The global `mesh-cutoff` is only overridden if one of the heuristics increased it
+            if meshcut != meshcut_glob:
+                parameters['mesh-cutoff'] = f'{meshcut} {meshcut_units}'
 
         return parameters
 
-    def _get_basis(self, key, structure):  # noqa: PLR0912
+    @classmethod
+    @functools.lru_cache(maxsize=128)
+    def _get_protocol_basis(cls, key, kinds):
         """
-        Method to construct the `basis` input.
-        Heuristics are applied, a dictionary with the basis is returned.
+        Return the `basis` of protocol `key` with the heuristics applied for the given `kinds`.
+        The result is memoized, therefore it must not be modified by the caller.
         """
-        basis = self._protocols[key]['basis'].copy()
+        basis = cls._protocols[key]['basis'].copy()
 
-        if 'atomic_heuristics' in self._protocols[key]:
-            atomic_heuristics = self._protocols[key]['atomic_heuristics']
+        if 'atomic_heuristics' in cls._protocols[key]:
+            atomic_heuristics = cls._protocols[key]['atomic_heuristics']
 
             pol_dict = {}
             size_dict = {}
             pao_block_dict = {}
 
             # Run through all the heuristics
-            for kind in structure.kinds:
-                need_to_apply = False
-                try:
-                    cust_basis = atomic_heuristics[kind.symbol]['basis']
-                    need_to_apply = True
-                except KeyError:
-                    pass
-                if need_to_apply:
+            for name, symbol in kinds:
+                cust_basis = atomic_heuristics.get(symbol, {}).get('basis')
+                if cust_basis is not None:
                     if 'split-tail-norm' in cust_basis:
                         basis['pao-split-tail-norm'] = True
                     if 'polarization' in cust_basis:
-                        pol_dict[kind.name] = cust_basis['polarization']
+                        pol_dict[name] = cust_basis['polarization']
                     if 'size' in cust_basis:
-                        size_dict[kind.name] = cust_basis['size']
+                        size_dict[name] = cust_basis['size']
                     if 'pao-block' in cust_basis:
-                        pao_block_dict[kind.name] = cust_basis['pao-block']
-                        if kind.name != kind.symbol:
-                            pao_block_dict[kind.name] = pao_block_dict[kind.name].replace(kind.symbol, kind.name)
+                        pao_block_dict[name] = cust_basis['pao-block']
+                        if name != symbol:
+                            pao_block_dict[name] = pao_block_dict[name].replace(symbol, name)
 
             if pol_dict:
-                card = '\n'
-                for k, value in pol_dict.items():
-                    card = card + f'  {k}  {value} \n'
-                card = card + '%endblock paopolarizationscheme'
-                basis['%block pao-polarization-scheme'] = card
+                lines = [f'  {k}  {value} ' for k, value in pol_dict.items()]
+                basis['%block pao-polarization-scheme'] = '\n'.join(['', *lines, '%endblock paopolarizationscheme'])
             if size_dict:
-                card = '\n'
-                for k, value in size_dict.items():
-                    card = card + f'  {k}  {value} \n'
-                card = card + '%endblock paobasissizes'
-                basis['%block pao-basis-sizes'] = card
+                lines = [f'  {k}  {value} ' for k, value in size_dict.items()]
+                basis['%block pao-basis-sizes'] = '\n'.join(['', *lines, '%endblock paobasissizes'])
             if pao_block_dict:
-                card = '\n'
-                for k, value in pao_block_dict.items():
-                    card = card + f'{value} \n'
-                card = card + '%endblock pao-basis'
-                basis['%block pao-basis'] = card
+                lines = [f'{value} ' for value in pao_block_dict.values()]
+                basis['%block pao-basis'] = '\n'.join(['', *lines, '%endblock pao-basis'])
 
         return basis
 
     def _get_kpoints(self, key, structure, reference_workchain):
-        from aiida.orm import KpointsData
-
         if reference_workchain:
-            kpoints_mesh = KpointsData()
+            kpoints_mesh = orm.KpointsData()
             kpoints_mesh.set_cell_from_structure(structure)
             previous_wc_kp = reference_workchain.inputs.kpoints
             kpoints_mesh.set_kpoints_mesh(
@@ -290,7 +344,7 @@ class SiestaCommonRelaxInputGenerator(CommonRelaxInputGenerator):
             return kpoints_mesh
 
         if 'kpoints' in self._protocols[key]:
-            kpoints_mesh = KpointsData()
+            kpoints_mesh = orm.KpointsData()
             kpoints_mesh.set_cell_from_structure(structure)
             kp_dict = self._protocols[key]['kpoints']
             if 'offset' in kp_dict:
@@ -302,6 +356,4 @@ class SiestaCommonRelaxInputGenerator(CommonRelaxInputGenerator):
         return None
 
     def _get_pseudo_fam(self, key):
-        from aiida.orm import Str
-
-        return Str(self._protocols[key]['pseudo_family'])
+        return orm.Str(self._protocols[key]['pseudo_family'])
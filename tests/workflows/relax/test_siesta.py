@@ -71,3 +71,57 @@ def test_supported_spin_types(generator, default_builder_inputs):
         inputs['spin_type'] = spin_type
         builder = generator.get_builder(**inputs)
         assert isinstance(builder, engine.ProcessBuilder)
+
+
+def test_protocols_cached(generator):
+    """Test that the protocol file is parsed once and shared between instances of the input generator."""
+    other = plugins.WorkflowFactory('common_workflows.relax.siesta').get_input_generator()
+    assert other._protocols is generator._protocols
+
+
+def test_get_param_memoized(generator, generate_structure):
+    """Test that the memoized ``parameters`` and ``basis`` are returned as copies that can be safely modified."""
+    structure = generate_structure(symbols=('Si',))
+    parameters = generator._get_param('moderate', structure, None)
+    basis = generator._get_basis('moderate', structure)
+    parameters['mesh-cutoff'] = 'modified'
+    basis['modified'] = True
+
+    assert generator._get_param('moderate', structure, None)['mesh-cutoff'] != 'modified'
+    assert 'modified' not in generator._get_basis('moderate', structure)
+
+
+@pytest.mark.usefixtures('psml_family')
+def test_pseudo_family_lookup_cached(generator, default_builder_inputs):
+    """Test that the pseudo family is only looked up once in the database for repeated calls of ``get_builder``."""
+    from aiida_common_workflows.workflows.relax.siesta.generator import _cached_get_group
+
+    _cached_get_group.cache_clear()
+    generator.get_builder(**default_builder_inputs)
+    generator.get_builder(**default_builder_inputs)
+    assert _cached_get_group.cache_info().hits == 1
+
+
+@pytest.mark.usefixtures('psml_family')
+def test_magnetization_per_site(generator, generate_structure, default_builder_inputs):
+    """Test that ``magnetization_per_site`` is converted in the ``dm-init-spin`` block of the parameters."""
+    from aiida_common_workflows.common import SpinType
+
+    inputs = default_builder_inputs
+    inputs['structure'] = generate_structure(symbols=('Fe', 'Fe'))
+    inputs['spin_type'] = SpinType.COLLINEAR
+    inputs['magnetization_per_site'] = [2.0, -2.0]
+    builder = generator.get_builder(**inputs)
+    assert builder.parameters['%block dm-init-spin'] == '\n 1 2.0 \n 2 -2.0 \n%endblock dm-init-spin'
+
+
+def test_validate_protocol(generator, monkeypatch):
+    """Test that a protocol is validated when it is first used and that invalid protocols raise."""
+    protocol = generator.get_protocol('moderate')
+    protocol.pop('basis')
+    monkeypatch.setattr(generator, '_protocols', {'moderate': protocol})
+    monkeypatch.setattr(generator, '_validated_protocols', set())
+
+    with pytest.raises(RuntimeError, match=r'protocol `moderate` does not define the mandatory key `basis`'):
+        generator._validate_protocol('moderate')
+    assert 'moderate' not in generator._validated_protocols